@@ -1,26 +1,74 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.middleware.sessions import SessionMiddleware
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from starlette.middleware.sessions import SessionMiddleware
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.datastructures import MutableHeaders
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Optional, Dict, Any, Tuple, Literal
 import uuid
+import asyncio
+import time
 from datetime import datetime, timezone, timedelta
-import httpx
 import json
+import zlib
+import base64
+import hmac
+import hashlib
+import ipaddress
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Motor/PyMongo are imported and the client created on first use, so importing
+# this module (cold starts, tests, tooling) doesn't pay for them up front.
+_client = None
+
+def get_client():
+    global _client
+    if _client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        _client = AsyncIOMotorClient(
+            os.environ['MONGO_URL'],
+            serverSelectionTimeoutMS=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '30000'))
+        )
+    return _client
+
+class LazyDatabase:
+    """Stand-in for the Motor database that creates the client on first access"""
+
+    def __init__(self):
+        self._database = None
+
+    def get(self):
+        if self._database is None:
+            self._database = get_client()[os.environ['DB_NAME']]
+        return self._database
+
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
+
+    def __getitem__(self, name: str):
+        return self.get()[name]
+
+db = LazyDatabase()
+
+# Tenancy: every cohort-owned document carries a cohort_id
+DEFAULT_COHORT_ID = os.environ.get('DEFAULT_COHORT_ID', 'default')
+# Org admins may work across cohorts and assign users to them
+ORG_ADMIN_EMAILS = {email.strip().lower() for email in os.environ.get('ORG_ADMIN_EMAILS', '').split(',') if email.strip()}
 
 # Create the main app
 app = FastAPI(title="Semillero Digital - Classroom Enhancer")
@@ -41,6 +89,8 @@ class User(BaseModel):
     name: str
     picture: Optional[str] = None
     role: str = Field(default="student")  # student, teacher, coordinator
+    cohort_id: str = Field(default=DEFAULT_COHORT_ID)
+    google_user_id: Optional[str] = None  # Classroom userId, linked on first submission
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class UserSession(BaseModel):
@@ -58,6 +108,7 @@ class Classroom(BaseModel):
     description: Optional[str] = None
     room: Optional[str] = None
     teacher_id: str
+    cohort_id: str = Field(default=DEFAULT_COHORT_ID)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Assignment(BaseModel):
@@ -68,12 +119,14 @@ class Assignment(BaseModel):
     description: Optional[str] = None
     due_date: Optional[datetime] = None
     max_points: Optional[float] = None
+    cohort_id: str = Field(default=DEFAULT_COHORT_ID)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class StudentEnrollment(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     student_id: str
     classroom_id: str
+    cohort_id: str = Field(default=DEFAULT_COHORT_ID)
     enrolled_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Submission(BaseModel):
@@ -84,6 +137,7 @@ class Submission(BaseModel):
     state: str  # CREATED, TURNED_IN, RETURNED, RECLAIMED_BY_STUDENT
     grade: Optional[float] = None
     submitted_at: Optional[datetime] = None
+    cohort_id: str = Field(default=DEFAULT_COHORT_ID)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ProgressSummary(BaseModel):
@@ -123,6 +177,666 @@ def parse_from_mongo(item):
                 item[key] = parse_from_mongo(value)
     return item
 
+# Rate limiting and admission control
+class RateLimit(BaseModel):
+    requests: int
+    period: float  # seconds
+
+# Per-route budgets, matched by longest path prefix
+ROUTE_RATE_LIMITS: Dict[str, RateLimit] = {
+    "/api/auth/session": RateLimit(requests=5, period=60),  # calls the external auth provider
+    "/api/auth/": RateLimit(requests=30, period=60),
+    "/api/notifications": RateLimit(requests=60, period=60),
+    "/api/webhooks/": RateLimit(requests=6000, period=60),  # Pub/Sub pushes come from few addresses
+    "/api/": RateLimit(requests=120, period=60),
+}
+
+# Max in-flight requests per route class, shared by all clients
+ROUTE_CLASS_CONCURRENCY: Dict[str, int] = {
+    "auth": 10,
+    "ingest": 200,
+    "write": 20,
+    "read": 100,
+}
+
+def parse_trusted_proxies(value: str) -> list:
+    """Comma-separated addresses or CIDR ranges -> ip_network list"""
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in value.split(',') if part.strip()]
+
+# Only these peers may set X-Forwarded-For. The app runs behind the
+# api-gateway on the compose network, so loopback and private ranges are
+# trusted by default; set TRUSTED_PROXIES (empty to trust none) when the app
+# is reachable from untrusted private addresses.
+DEFAULT_TRUSTED_PROXIES = "127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16"
+TRUSTED_PROXIES = parse_trusted_proxies(os.environ.get('TRUSTED_PROXIES', DEFAULT_TRUSTED_PROXIES))
+
+class InMemoryRateLimitBackend:
+    """Token buckets kept in process memory (one per client key and route)"""
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        # key -> (tokens, updated_at, full_at)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+
+    async def hit(self, key: str, limit: RateLimit) -> float:
+        """Consume one token; return 0 if allowed, else seconds until retry"""
+        now = time.monotonic()
+        capacity = float(limit.requests)
+        rate = limit.requests / limit.period
+        tokens, updated_at, _ = self._buckets.get(key, (capacity, now, now))
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        if key not in self._buckets and len(self._buckets) >= self.max_keys:
+            self._evict(now)
+        self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+        return 0.0 if allowed else (1 - tokens) / rate
+
+    def _evict(self, now: float):
+        """Bound memory, dropping refilled buckets (equivalent to absent ones) first"""
+        for key in [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+        if len(self._buckets) < self.max_keys:
+            return
+        # Still full of active clients: drop the ones closest to refilled
+        closest = sorted(self._buckets, key=lambda key: self._buckets[key][2])
+        for key in closest[:len(closest) // 4 or 1]:
+            del self._buckets[key]
+
+class MongoRateLimitBackend:
+    """Token buckets in MongoDB, shared by all app instances
+
+    Same semantics as InMemoryRateLimitBackend: each hit refills and consumes
+    atomically in a single pipeline update, using the server clock ($$NOW) so
+    app instances with skewed clocks agree.
+    """
+
+    def __init__(self, collection_name: str = "rate_limits"):
+        self.collection_name = collection_name
+
+    async def ensure_indexes(self):
+        await db[self.collection_name].create_index("expires_at", expireAfterSeconds=0)
+
+    async def hit(self, key: str, limit: RateLimit) -> float:
+        from pymongo import ReturnDocument
+
+        capacity = float(limit.requests)
+        rate_ms = limit.requests / (limit.period * 1000)  # tokens per millisecond
+        now_ms = {'$toLong': '$$NOW'}
+        doc = await db[self.collection_name].find_one_and_update(
+            {'_id': key},
+            [
+                {'$set': {
+                    'tokens': {'$min': [capacity, {'$add': [
+                        {'$ifNull': ['$tokens', capacity]},
+                        {'$multiply': [{'$subtract': [now_ms, {'$ifNull': ['$updated_at', now_ms]}]}, rate_ms]}
+                    ]}]},
+                    'updated_at': now_ms
+                }},
+                {'$set': {'allowed': {'$gte': ['$tokens', 1]}}},
+                {'$set': {
+                    'tokens': {'$cond': ['$allowed', {'$subtract': ['$tokens', 1]}, '$tokens']},
+                    # An idle bucket is full again after one period, so it can go
+                    'expires_at': {'$add': ['$$NOW', int(limit.period * 1000)]}
+                }}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if doc['allowed']:
+            return 0.0
+        return (1 - doc['tokens']) / rate_ms / 1000
+
+# Hashes of session tokens validated against user_sessions -> monotonic expiry.
+# Only these are used as rate-limit keys; made-up tokens fall back to the client
+# IP. This is a per-process cache: a miss is checked against Mongo, so every
+# worker keys a session the same way.
+validated_sessions: OrderedDict = OrderedDict()
+MAX_VALIDATED_SESSIONS = 10000
+
+def hash_session_token(session_token: str) -> str:
+    return hashlib.sha256(session_token.encode()).hexdigest()
+
+def remember_validated_session(session_token: str, expires_at: datetime):
+    token_hash = hash_session_token(session_token)
+    ttl = (expires_at - datetime.now(timezone.utc)).total_seconds()
+    validated_sessions[token_hash] = time.monotonic() + ttl
+    validated_sessions.move_to_end(token_hash)
+    while len(validated_sessions) > MAX_VALIDATED_SESSIONS:
+        validated_sessions.popitem(last=False)
+
+def forget_validated_session(session_token: str):
+    validated_sessions.pop(hash_session_token(session_token), None)
+
+def is_validated_session(session_token: str) -> bool:
+    token_hash = hash_session_token(session_token)
+    expires_at = validated_sessions.get(token_hash)
+    if expires_at is None:
+        return False
+    if time.monotonic() > expires_at:
+        del validated_sessions[token_hash]
+        return False
+    return True
+
+async def find_valid_session(session_token: str) -> Optional[Dict[str, Any]]:
+    """The unexpired user_sessions entry for a token, if any"""
+    session = await db.user_sessions.find_one(
+        {'session_token': session_token},
+        {'_id': 0, 'user_id': 1, 'expires_at': 1}
+    )
+    if not session:
+        return None
+    expires_at = datetime.fromisoformat(session['expires_at'])
+    if datetime.now(timezone.utc) > expires_at:
+        return None
+    return {**session, 'expires_at': expires_at}
+
+def is_trusted_proxy(ip: str) -> bool:
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+def get_client_ip(scope) -> str:
+    """Client address, honouring X-Forwarded-For only when sent by a trusted proxy"""
+    client_addr = scope.get('client')
+    ip = client_addr[0] if client_addr else 'unknown'
+    if not is_trusted_proxy(ip):
+        return ip
+    headers = dict(scope.get('headers') or [])
+    forwarded_for = headers.get(b'x-forwarded-for', b'').decode('latin-1')
+    # Walk right to left: the first hop that isn't one of our proxies is the client
+    for hop in reversed([hop.strip() for hop in forwarded_for.split(',') if hop.strip()]):
+        if not is_trusted_proxy(hop):
+            return hop
+    return ip
+
+def get_session_token(scope) -> Optional[str]:
+    headers = dict(scope.get('headers') or [])
+    cookie = headers.get(b'cookie', b'').decode('latin-1')
+    for part in cookie.split(';'):
+        name, _, value = part.strip().partition('=')
+        if name == 'session_token' and value:
+            return value
+    authorization = headers.get(b'authorization', b'').decode('latin-1')
+    if authorization.lower().startswith('bearer '):
+        return authorization[7:].strip() or None
+    return None
+
+async def get_rate_limit_key(scope, by_session: bool = True) -> str:
+    """Key clients by validated session token hash, falling back to client IP"""
+    if by_session:
+        session_token = get_session_token(scope)
+        if session_token and not is_validated_session(session_token):
+            session = await find_valid_session(session_token)
+            if session:
+                remember_validated_session(session_token, session['expires_at'])
+        if session_token and is_validated_session(session_token):
+            return f"session:{hash_session_token(session_token)}"
+    return f"ip:{get_client_ip(scope)}"
+
+def get_route_class(method: str, path: str) -> str:
+    if path.startswith("/api/auth/"):
+        return "auth"
+    if path.startswith("/api/webhooks/"):
+        return "ingest"
+    return "read" if method in ("GET", "HEAD", "OPTIONS") else "write"
+
+class RateLimitMiddleware:
+    """ASGI middleware applying per-route rate limits and concurrency caps"""
+
+    def __init__(self, app, backend=None, route_limits: Dict[str, RateLimit] = None,
+                 concurrency: Dict[str, int] = None):
+        self.app = app
+        self.backend = backend or InMemoryRateLimitBackend()
+        limits = ROUTE_RATE_LIMITS if route_limits is None else route_limits
+        # Longest prefix first so the most specific budget wins
+        self.route_limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+        concurrency = ROUTE_CLASS_CONCURRENCY if concurrency is None else concurrency
+        self.semaphores = {name: asyncio.Semaphore(cap) for name, cap in concurrency.items()}
+
+    def get_route_limit(self, path: str) -> Tuple[Optional[str], Optional[RateLimit]]:
+        for prefix, limit in self.route_limits:
+            if path.startswith(prefix):
+                return prefix, limit
+        return None, None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] == 'OPTIONS':
+            await self.app(scope, receive, send)
+            return
+
+        path = scope['path']
+        prefix, limit = self.get_route_limit(path)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Auth routes run before a session exists, so they are always keyed by IP
+        route_class = get_route_class(scope['method'], path)
+        key = await get_rate_limit_key(scope, by_session=route_class != "auth")
+        retry_after = await self.backend.hit(f"{key}|{prefix}", limit)
+        if retry_after > 0:
+            await self.reject(send, 429, "Too many requests", retry_after)
+            return
+
+        semaphore = self.semaphores.get(route_class)
+        if semaphore is None:
+            await self.app(scope, receive, send)
+            return
+        if semaphore.locked():
+            await self.reject(send, 503, "Server busy, try again shortly", 1)
+            return
+        async with semaphore:
+            await self.app(scope, receive, send)
+
+    async def reject(self, send, status: int, detail: str, retry_after: float):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'retry-after', str(max(1, int(retry_after + 0.999))).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+# Response compression
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get('COMPRESSION_MINIMUM_SIZE', '500'))
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, honouring q=0"""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+# Already-compressed or streaming-sensitive media that isn't worth recompressing
+UNCOMPRESSIBLE_CONTENT_TYPES = (
+    'image/', 'video/', 'audio/', 'font/woff', 'application/zip', 'application/gzip',
+    'application/x-gzip', 'application/pdf', 'application/octet-stream', 'text/event-stream',
+)
+
+class StreamCompressor:
+    """Incremental br/gzip encoder; each chunk is flushed so streams aren't delayed"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits=31 writes a gzip header and trailer
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+        self.encoding = encoding
+
+    def process(self, data: bytes) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses above a size threshold with br or gzip
+
+    Only the first minimum_size bytes are buffered to decide; larger or
+    streaming bodies are then compressed chunk by chunk.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MINIMUM_SIZE,
+                 gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get('headers') or [])
+        encoding = negotiate_encoding(headers.get(b'accept-encoding', b'').decode('latin-1'))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+        buffered = b''
+        compressor: Optional[StreamCompressor] = None
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough, buffered, compressor
+            if message['type'] == 'http.response.start':
+                response_headers = MutableHeaders(raw=list(message.get('headers', [])))
+                content_type = response_headers.get('content-type', '')
+                if 'content-encoding' in response_headers or content_type.startswith(UNCOMPRESSIBLE_CONTENT_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if passthrough or message['type'] != 'http.response.body' or start_message is None:
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if compressor is not None:
+                chunk = compressor.process(body)
+                if not more_body:
+                    chunk += compressor.finish()
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': more_body})
+                return
+
+            buffered += body
+            if len(buffered) < self.minimum_size:
+                if more_body:
+                    return
+                # Small response: send it untouched
+                await send(start_message)
+                await send({'type': 'http.response.body', 'body': buffered})
+                return
+
+            response_headers = MutableHeaders(raw=list(start_message.get('headers', [])))
+            response_headers['Content-Encoding'] = encoding
+            response_headers.add_vary_header('Accept-Encoding')
+            compressor = StreamCompressor(encoding, self.gzip_level, self.brotli_quality)
+            chunk = compressor.process(buffered)
+            buffered = b''
+            if more_body:
+                del response_headers['Content-Length']
+            else:
+                chunk += compressor.finish()
+                response_headers['Content-Length'] = str(len(chunk))
+            await send({**start_message, 'headers': response_headers.raw})
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+# Sparse fieldsets
+def parse_fields(fields: Optional[str], model) -> Optional[List[str]]:
+    """Validate a comma-separated ?fields= value against a model's fields"""
+    if not fields:
+        return None
+    selected = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in selected if name not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+def mongo_projection(fields: Optional[List[str]]) -> Dict[str, int]:
+    """Build a MongoDB projection that never returns _id"""
+    projection = {'_id': 0}
+    if fields:
+        projection.update({name: 1 for name in fields})
+    return projection
+
+def select_fields(items: List[BaseModel], fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+    return [item.model_dump(mode='json', include=set(fields) if fields else None) for item in items]
+
+def compact_progress(progress: List[ProgressSummary], fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Send each classroom once instead of inlining classroom_name per summary"""
+    classrooms = {summary.classroom_id: {'name': summary.classroom_name} for summary in progress}
+    exclude = {'classroom_name'}
+    if fields:
+        exclude |= set(ProgressSummary.model_fields) - set(fields) - {'classroom_id'}
+    return {
+        'classrooms': classrooms,
+        'progress': [summary.model_dump(mode='json', exclude=exclude) for summary in progress]
+    }
+
+# Multi-tenancy
+# Compound indexes lead with cohort_id so a cohort's queries only walk its own
+# index range. The same prefixes double as shard keys: ranged on cohort_id keeps
+# each cohort's documents together (and lets a large cohort be zoned onto its
+# own shard), while the second field splits a cohort across chunks.
+TENANT_INDEXES: Dict[str, List[Tuple[List[Tuple[str, int]], Dict[str, Any]]]] = {
+    "users": [
+        ([("cohort_id", 1), ("id", 1)], {"unique": True}),
+        ([("cohort_id", 1), ("role", 1)], {}),
+        ([("cohort_id", 1), ("google_user_id", 1)], {})
+    ],
+    "classrooms": [([("cohort_id", 1), ("google_classroom_id", 1)], {"unique": True})],
+    "assignments": [([("cohort_id", 1), ("google_assignment_id", 1)], {"unique": True})],
+    "submissions": [([("cohort_id", 1), ("google_submission_id", 1)], {"unique": True})],
+    "student_enrollments": [([("cohort_id", 1), ("classroom_id", 1), ("student_id", 1)], {"unique": True})],
+}
+
+SHARD_KEYS: Dict[str, Dict[str, int]] = {
+    "users": {"cohort_id": 1, "id": 1},
+    "classrooms": {"cohort_id": 1, "google_classroom_id": 1},
+    "assignments": {"cohort_id": 1, "google_assignment_id": 1},
+    "submissions": {"cohort_id": 1, "google_submission_id": 1},
+    "student_enrollments": {"cohort_id": 1, "classroom_id": 1},
+}
+
+class TenantCollection:
+    """Collection proxy that adds the cohort_id to every filter and inserted document"""
+
+    def __init__(self, collection, cohort_id: str):
+        self.collection = collection
+        self.cohort_id = cohort_id
+
+    def scope(self, filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return {**(filter or {}), 'cohort_id': self.cohort_id}
+
+    def find(self, filter=None, *args, **kwargs):
+        return self.collection.find(self.scope(filter), *args, **kwargs)
+
+    async def find_one(self, filter=None, *args, **kwargs):
+        return await self.collection.find_one(self.scope(filter), *args, **kwargs)
+
+    async def count_documents(self, filter=None, **kwargs):
+        return await self.collection.count_documents(self.scope(filter), **kwargs)
+
+    def aggregate(self, pipeline, **kwargs):
+        return self.collection.aggregate([{'$match': self.scope()}] + list(pipeline), **kwargs)
+
+    async def insert_one(self, document, **kwargs):
+        return await self.collection.insert_one({**document, 'cohort_id': self.cohort_id}, **kwargs)
+
+    async def insert_many(self, documents, **kwargs):
+        return await self.collection.insert_many([{**doc, 'cohort_id': self.cohort_id} for doc in documents], **kwargs)
+
+    async def update_one(self, filter, update, **kwargs):
+        return await self.collection.update_one(self.scope(filter), update, **kwargs)
+
+    async def update_many(self, filter, update, **kwargs):
+        return await self.collection.update_many(self.scope(filter), update, **kwargs)
+
+    async def delete_one(self, filter, **kwargs):
+        return await self.collection.delete_one(self.scope(filter), **kwargs)
+
+    async def delete_many(self, filter, **kwargs):
+        return await self.collection.delete_many(self.scope(filter), **kwargs)
+
+class TenantDatabase:
+    """Database view where every collection is scoped to one cohort"""
+
+    def __init__(self, database, cohort_id: str):
+        self.database = database
+        self.cohort_id = cohort_id
+
+    def __getattr__(self, name: str) -> TenantCollection:
+        return TenantCollection(self.database[name], self.cohort_id)
+
+    def __getitem__(self, name: str) -> TenantCollection:
+        return TenantCollection(self.database[name], self.cohort_id)
+
+class TenantCache:
+    """Per-cohort LRU/TTL caches, so one cohort's churn never evicts another's entries"""
+
+    def __init__(self, max_entries_per_tenant: int = 1000, ttl: float = 30):
+        self.max_entries_per_tenant = max_entries_per_tenant
+        self.ttl = ttl
+        self._namespaces: Dict[str, OrderedDict] = {}
+
+    def get(self, cohort_id: str, key: Any) -> Any:
+        namespace = self._namespaces.get(cohort_id)
+        if namespace is None or key not in namespace:
+            return None
+        expires_at, value = namespace[key]
+        if time.monotonic() > expires_at:
+            del namespace[key]
+            return None
+        namespace.move_to_end(key)
+        return value
+
+    def set(self, cohort_id: str, key: Any, value: Any):
+        namespace = self._namespaces.setdefault(cohort_id, OrderedDict())
+        namespace[key] = (time.monotonic() + self.ttl, value)
+        namespace.move_to_end(key)
+        while len(namespace) > self.max_entries_per_tenant:
+            namespace.popitem(last=False)
+
+    def invalidate(self, cohort_id: str, key: Any = None):
+        """Drop one key, or the whole cohort namespace when key is None"""
+        if key is None:
+            self._namespaces.pop(cohort_id, None)
+        elif cohort_id in self._namespaces:
+            self._namespaces[cohort_id].pop(key, None)
+
+class TenantMetrics:
+    """Request counts and latency per cohort"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    def record(self, cohort_id: str, latency_ms: float, error: bool):
+        metrics = self._metrics.setdefault(cohort_id, {
+            'requests': 0, 'errors': 0, 'total_latency_ms': 0.0, 'max_latency_ms': 0.0
+        })
+        metrics['requests'] += 1
+        metrics['errors'] += int(error)
+        metrics['total_latency_ms'] += latency_ms
+        metrics['max_latency_ms'] = max(metrics['max_latency_ms'], latency_ms)
+
+    def snapshot(self, cohort_id: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        cohorts = [cohort_id] if cohort_id else list(self._metrics)
+        return {
+            cohort: {
+                **self._metrics[cohort],
+                'avg_latency_ms': self._metrics[cohort]['total_latency_ms'] / self._metrics[cohort]['requests']
+            }
+            for cohort in cohorts if cohort in self._metrics
+        }
+
+tenant_cache = TenantCache()
+tenant_metrics = TenantMetrics()
+
+class TenantMetricsMiddleware:
+    """ASGI middleware recording latency under the cohort a handler resolved"""
+
+    def __init__(self, app, metrics: TenantMetrics = tenant_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # get_tenant stores the cohort on request.state, which lives in the scope
+            cohort_id = scope.get('state', {}).get('cohort_id')
+            if cohort_id:
+                self.metrics.record(cohort_id, (time.perf_counter() - start) * 1000, status_code >= 500)
+
+class Tenant(BaseModel):
+    cohort_id: str
+
+    @property
+    def db(self) -> TenantDatabase:
+        return TenantDatabase(db, self.cohort_id)
+
+def is_org_admin(user: User) -> bool:
+    return user.email.lower() in ORG_ADMIN_EMAILS
+
+def get_tenant(request: Request, user: User) -> Tenant:
+    """Resolve the cohort for a request; org admins may switch with X-Cohort-ID"""
+    cohort_id = user.cohort_id
+    requested = request.headers.get('x-cohort-id')
+    if requested and requested != cohort_id:
+        if not is_org_admin(user):
+            raise HTTPException(status_code=403, detail="Access denied")
+        cohort_id = requested
+    request.state.cohort_id = cohort_id
+    return Tenant(cohort_id=cohort_id)
+
+async def ensure_tenant_indexes():
+    for collection, indexes in TENANT_INDEXES.items():
+        # Documents written before tenancy belong to the default cohort
+        await db[collection].update_many(
+            {'cohort_id': {'$exists': False}},
+            {'$set': {'cohort_id': DEFAULT_COHORT_ID}}
+        )
+        for keys, options in indexes:
+            await db[collection].create_index(keys, **options)
+
+async def shard_tenant_collections():
+    """Shard tenant collections on their cohort-led keys (requires mongos)"""
+    admin = get_client().admin
+    await admin.command('enableSharding', db.name)
+    for collection, key in SHARD_KEYS.items():
+        await admin.command('shardCollection', f"{db.name}.{collection}", key=key)
+
+async def move_user_cohort(user_id: str, current: str, cohort_id: str, session=None) -> bool:
+    """Move a user and their enrollments and submissions between cohorts
+
+    cohort_id is part of every shard key, so each document is updated by its
+    full shard key. Returns False if the user is no longer in the current cohort.
+    """
+    from pymongo import UpdateOne
+
+    for collection in ('student_enrollments', 'submissions'):
+        keys = ['id', *SHARD_KEYS[collection]]
+        docs = await db[collection].find(
+            {'cohort_id': current, 'student_id': user_id},
+            {'_id': 0, **{key: 1 for key in keys}},
+            session=session
+        ).to_list(length=None)
+        if docs:
+            await db[collection].bulk_write([
+                UpdateOne({key: doc.get(key) for key in keys}, {'$set': {'cohort_id': cohort_id}})
+                for doc in docs
+            ], session=session)
+    # The user goes last so a failure leaves them in their old cohort
+    result = await db.users.update_one(
+        {'cohort_id': current, 'id': user_id},
+        {'$set': {'cohort_id': cohort_id}},
+        session=session
+    )
+    return result.matched_count == 1
+
 async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = None) -> Optional[User]:
     """Get current user from session token (cookie or header)"""
     session_token = None
@@ -139,13 +853,16 @@ async def get_current_user(request: Request, credentials: HTTPAuthorizationCrede
         return None
     
     # Find user session in database
-    session = await db.user_sessions.find_one({'session_token': session_token})
-    if not session or datetime.now(timezone.utc) > datetime.fromisoformat(session['expires_at']):
+    session = await find_valid_session(session_token)
+    if not session:
         return None
     
     # Get user
-    user = await db.users.find_one({'id': session['user_id']})
-    return User(**user) if user else None
+    user = await db.users.find_one({'id': session['user_id']}, {'_id': 0})
+    if not user:
+        return None
+    remember_validated_session(session_token, session['expires_at'])
+    return User(**user)
 
 # Auth Routes
 @api_router.post("/auth/session")
@@ -159,6 +876,8 @@ async def create_session(request: Request, response: Response):
             raise HTTPException(status_code=400, detail="session_id required")
         
         # Call Emergent Auth API
+        import httpx
+
         async with httpx.AsyncClient() as client:
             headers = {'X-Session-ID': session_id}
             auth_response = await client.get(
@@ -183,6 +902,7 @@ async def create_session(request: Request, response: Response):
                 role="student"  # Default role, can be changed by coordinator
             )
             await db.users.insert_one(prepare_for_mongo(new_user.dict()))
+            tenant_cache.invalidate(new_user.cohort_id)
             user = new_user
         else:
             user = User(**existing_user)
@@ -231,19 +951,33 @@ async def logout(request: Request, response: Response, credentials: HTTPAuthoriz
         session_token = request.cookies.get('session_token') or (credentials.credentials if credentials else None)
         if session_token:
             await db.user_sessions.delete_one({'session_token': session_token})
+            forget_validated_session(session_token)
     
     response.delete_cookie("session_token", path="/")
     return {"message": "Logged out successfully"}
 
 # User Management Routes
 @api_router.get("/users", response_model=List[User])
-async def get_users(request: Request, credentials: HTTPAuthorizationCredentials = None):
-    """Get all users (coordinator only)"""
+async def get_users(request: Request, fields: Optional[str] = None, credentials: HTTPAuthorizationCredentials = None):
+    """Get all users (coordinator only), optionally limited to ?fields=a,b"""
     current_user = await get_current_user(request, credentials)
     if not current_user or current_user.role != "coordinator":
         raise HTTPException(status_code=403, detail="Access denied")
     
-    users = await db.users.find().to_list(length=None)
+    tenant = get_tenant(request, current_user)
+    selected = parse_fields(fields, User)
+    cache_key = ('users', tuple(selected or ()))
+    users = tenant_cache.get(tenant.cohort_id, cache_key)
+    if users is None:
+        # Parsed before caching so cached entries are never mutated by readers
+        users = [
+            parse_from_mongo(user)
+            for user in await tenant.db.users.find({}, mongo_projection(selected)).to_list(length=None)
+        ]
+        tenant_cache.set(tenant.cohort_id, cache_key, users)
+    if selected:
+        # Partial documents don't validate as User, so skip the response model
+        return JSONResponse(jsonable_encoder(users))
     return [User(**user) for user in users]
 
 @api_router.put("/users/{user_id}/role")
@@ -256,20 +990,61 @@ async def update_user_role(user_id: str, role: str, request: Request, credential
     if role not in ["student", "teacher", "coordinator"]:
         raise HTTPException(status_code=400, detail="Invalid role")
     
-    result = await db.users.update_one({'id': user_id}, {'$set': {'role': role}})
+    tenant = get_tenant(request, current_user)
+    result = await tenant.db.users.update_one({'id': user_id}, {'$set': {'role': role}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    tenant_cache.invalidate(tenant.cohort_id)
     
     return {"message": "Role updated successfully"}
 
+@api_router.put("/users/{user_id}/cohort")
+async def update_user_cohort(user_id: str, cohort_id: str, request: Request, credentials: HTTPAuthorizationCredentials = None):
+    """Move a user to another cohort (org admin only)"""
+    current_user = await get_current_user(request, credentials)
+    if not current_user or not is_org_admin(current_user):
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    cohort_id = cohort_id.strip()
+    if not cohort_id:
+        raise HTTPException(status_code=400, detail="Invalid cohort")
+    
+    # Cross-cohort by design, so this goes through the unscoped collections
+    user = await db.users.find_one({'id': user_id}, {'_id': 0, 'cohort_id': 1})
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    current = user.get('cohort_id', DEFAULT_COHORT_ID)
+    if current == cohort_id:
+        return {"message": "Cohort updated successfully"}
+    
+    from pymongo.errors import OperationFailure
+    try:
+        async with await db.client.start_session() as session:
+            async with session.start_transaction():
+                moved = await move_user_cohort(user_id, current, cohort_id, session=session)
+    except OperationFailure as e:
+        if e.code != 20:  # IllegalOperation: standalone servers have no transactions
+            raise
+        moved = await move_user_cohort(user_id, current, cohort_id)
+    if not moved:
+        raise HTTPException(status_code=409, detail="User cohort changed concurrently")
+    tenant_cache.invalidate(current)
+    tenant_cache.invalidate(cohort_id)
+    
+    return {"message": "Cohort updated successfully"}
+
 # Dashboard Routes
 @api_router.get("/dashboard/progress", response_model=List[ProgressSummary])
-async def get_progress_dashboard(request: Request, credentials: HTTPAuthorizationCredentials = None):
-    """Get student progress dashboard"""
+async def get_progress_dashboard(request: Request, fields: Optional[str] = None, compact: bool = False,
+                                 credentials: HTTPAuthorizationCredentials = None):
+    """Get student progress dashboard (?fields=a,b for a sparse fieldset, ?compact=true to dedupe classrooms)"""
     current_user = await get_current_user(request, credentials)
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
+    get_tenant(request, current_user)
+    selected = parse_fields(fields, ProgressSummary)
+    
     # Mock data for now - will be replaced with Google Classroom API integration
     mock_progress = [
         ProgressSummary(
@@ -300,6 +1075,10 @@ async def get_progress_dashboard(request: Request, credentials: HTTPAuthorizatio
         )
     ]
     
+    if compact:
+        return JSONResponse(compact_progress(mock_progress, selected))
+    if selected:
+        return JSONResponse(select_fields(mock_progress, selected))
     return mock_progress
 
 @api_router.get("/dashboard/metrics")
@@ -309,6 +1088,8 @@ async def get_metrics_dashboard(request: Request, credentials: HTTPAuthorization
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
+    get_tenant(request, current_user)
+    
     # Mock metrics data
     metrics = {
         "total_students": 45,
@@ -328,12 +1109,15 @@ async def get_metrics_dashboard(request: Request, credentials: HTTPAuthorization
     return metrics
 
 @api_router.get("/classrooms", response_model=List[Classroom])
-async def get_classrooms(request: Request, credentials: HTTPAuthorizationCredentials = None):
-    """Get user's classrooms"""
+async def get_classrooms(request: Request, fields: Optional[str] = None, credentials: HTTPAuthorizationCredentials = None):
+    """Get user's classrooms, optionally limited to ?fields=a,b"""
     current_user = await get_current_user(request, credentials)
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
+    tenant = get_tenant(request, current_user)
+    selected = parse_fields(fields, Classroom)
+    
     # Mock classroom data
     mock_classrooms = [
         Classroom(
@@ -341,19 +1125,40 @@ async def get_classrooms(request: Request, credentials: HTTPAuthorizationCredent
             name="Desarrollo Web Frontend",
             section="A",
             description="Curso de HTML, CSS y JavaScript",
-            teacher_id="teacher1"
+            teacher_id="teacher1",
+            cohort_id=tenant.cohort_id
         ),
         Classroom(
             google_classroom_id="gc_002", 
             name="Backend con Node.js",
             section="B",
             description="APIs REST y bases de datos",
-            teacher_id="teacher2"
+            teacher_id="teacher2",
+            cohort_id=tenant.cohort_id
         )
     ]
     
+    if selected:
+        return JSONResponse(select_fields(mock_classrooms, selected))
     return mock_classrooms
 
+@api_router.get("/tenants/metrics")
+async def get_tenant_metrics(request: Request, credentials: HTTPAuthorizationCredentials = None):
+    """Get request metrics for the caller's cohort (coordinator), or all cohorts (org admin)"""
+    current_user = await get_current_user(request, credentials)
+    if not current_user or (current_user.role != "coordinator" and not is_org_admin(current_user)):
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    tenant = get_tenant(request, current_user)
+    if is_org_admin(current_user) and not request.headers.get('x-cohort-id'):
+        return tenant_metrics.snapshot()
+    return tenant_metrics.snapshot(tenant.cohort_id)
+
+@api_router.get("/health")
+async def health():
+    """Liveness probe; doesn't touch the database"""
+    return {"status": "ok"}
+
 # Notification Routes  
 @api_router.get("/notifications")
 async def get_notifications(request: Request, credentials: HTTPAuthorizationCredentials = None):
@@ -362,6 +1167,8 @@ async def get_notifications(request: Request, credentials: HTTPAuthorizationCred
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
+    get_tenant(request, current_user)
+    
     # Mock notifications
     notifications = [
         {
@@ -384,9 +1191,517 @@ async def get_notifications(request: Request, credentials: HTTPAuthorizationCred
     
     return notifications
 
+# Classroom Push Ingestion
+# Google Classroom change notifications arrive through a Cloud Pub/Sub push
+# subscription. The endpoint only validates and enqueues; ClassroomEventBatcher
+# coalesces events per course and applies them with idempotent bulk upserts.
+# Notifications only reference a resource, so the batcher fetches it from the
+# Classroom API and resolves Google ids to our own before writing. Events that
+# can't be resolved yet are parked in classroom_pending_events, never stubbed.
+CLASSROOM_COLLECTIONS = {
+    "courses.courseWork": ("assignments", "google_assignment_id"),
+    "courses.courseWork.studentSubmissions": ("submissions", "google_submission_id"),
+}
+CLASSROOM_API_URL = "https://classroom.googleapis.com/v1"
+
+class ClassroomChangeEvent(BaseModel):
+    event_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    collection: str
+    event_type: Literal["CREATED", "MODIFIED", "DELETED"]
+    course_id: str
+    resource_id: str
+    course_work_id: Optional[str] = None  # set on studentSubmissions notifications
+    resource: Optional[Dict[str, Any]] = None  # full resource, when the publisher includes it
+    received_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    @property
+    def key(self) -> str:
+        return f"{self.collection}:{self.resource_id}"
+
+def parse_classroom_event(payload: Any, event_id: Optional[str] = None) -> ClassroomChangeEvent:
+    """Build an event from a Classroom notification body"""
+    if not isinstance(payload, dict):
+        raise ValueError("Notification must be an object")
+    resource_id = payload.get('resourceId') or {}
+    if not isinstance(resource_id, dict):
+        raise ValueError("resourceId must be an object")
+    return ClassroomChangeEvent(
+        event_id=event_id or payload.get('messageId') or str(uuid.uuid4()),
+        collection=payload.get('collection'),
+        event_type=payload.get('eventType'),
+        course_id=resource_id.get('courseId'),
+        resource_id=resource_id.get('id'),
+        course_work_id=resource_id.get('courseWorkId'),
+        resource=payload.get('resource')
+    )
+
+def parse_classroom_push(body: Any) -> List[ClassroomChangeEvent]:
+    """Accept a Pub/Sub push envelope, a single notification or a list of them"""
+    if isinstance(body, dict) and 'message' in body:
+        message = body['message']
+        if not isinstance(message, dict):
+            raise ValueError("message must be an object")
+        payload = json.loads(base64.b64decode(message['data']))
+        return [parse_classroom_event(payload, message.get('messageId'))]
+    if isinstance(body, list):
+        return [parse_classroom_event(payload) for payload in body]
+    return [parse_classroom_event(body)]
+
+def parse_google_due_date(resource: Dict[str, Any]) -> Optional[datetime]:
+    due_date = resource.get('dueDate')
+    if not due_date:
+        return None
+    due_time = resource.get('dueTime') or {}
+    return datetime(
+        due_date['year'], due_date['month'], due_date['day'],
+        due_time.get('hours', 23), due_time.get('minutes', 59), tzinfo=timezone.utc
+    )
+
+def assignment_fields(resource: Dict[str, Any], classroom_id: str) -> Dict[str, Any]:
+    """Map a Classroom courseWork resource onto Assignment fields"""
+    return {
+        'classroom_id': classroom_id,
+        'title': resource.get('title'),
+        'description': resource.get('description'),
+        'max_points': resource.get('maxPoints'),
+        'due_date': parse_google_due_date(resource)
+    }
+
+def submission_fields(resource: Dict[str, Any], assignment_id: str, student_id: str) -> Dict[str, Any]:
+    """Map a Classroom studentSubmission resource onto Submission fields"""
+    fields = {
+        'assignment_id': assignment_id,
+        'student_id': student_id,
+        'state': resource.get('state'),
+        'grade': resource.get('assignedGrade')
+    }
+    if resource.get('state') in ('TURNED_IN', 'RETURNED') and resource.get('updateTime'):
+        fields['submitted_at'] = datetime.fromisoformat(resource['updateTime'].replace('Z', '+00:00'))
+    return fields
+
+class ClassroomApiError(Exception):
+    """Classroom API refused a request (4xx); retrying the same call won't help"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Classroom API returned {status_code}")
+        self.status_code = status_code
+
+class ClassroomApiClient:
+    """Minimal Classroom REST client for the resources notifications only reference
+
+    Uses the bearer token in GOOGLE_CLASSROOM_ACCESS_TOKEN; without one the
+    batcher parks events that arrive without a resource. One connection pool
+    is shared by all calls, and at most max_concurrency run at once.
+    """
+
+    def __init__(self, access_token: Optional[str] = None, max_concurrency: int = 20):
+        self.access_token = access_token or os.environ.get('GOOGLE_CLASSROOM_ACCESS_TOKEN')
+        self._client = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.access_token)
+
+    async def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """GET a Classroom resource; None when it no longer exists"""
+        import httpx
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=CLASSROOM_API_URL,
+                headers={'Authorization': f"Bearer {self.access_token}"},
+                timeout=10
+            )
+        async with self._semaphore:
+            response = await self._client.get(path)
+        if response.status_code == 404:
+            return None
+        if 400 <= response.status_code < 500:
+            raise ClassroomApiError(response.status_code)
+        response.raise_for_status()
+        return response.json()
+
+    async def get_resource(self, event: ClassroomChangeEvent) -> Optional[Dict[str, Any]]:
+        if event.collection == "courses.courseWork":
+            return await self.get(f"courses/{event.course_id}/courseWork/{event.resource_id}")
+        return await self.get(
+            f"courses/{event.course_id}/courseWork/{event.course_work_id}/studentSubmissions/{event.resource_id}"
+        )
+
+    async def get_user_email(self, user_id: str) -> Optional[str]:
+        profile = await self.get(f"userProfiles/{user_id}")
+        return (profile or {}).get('emailAddress')
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class ClassroomEventBatcher:
+    """Queue of Classroom change events drained in batches by a background task"""
+
+    def __init__(self, max_batch_size: int = 500, flush_interval: float = 0.5, max_queue_size: int = 10000,
+                 max_attempts: int = 3, retry_delay: float = 1.0, api: Optional[ClassroomApiClient] = None):
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.api = api or ClassroomApiClient()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self._collecting: List[ClassroomChangeEvent] = []  # dequeued, not yet dispatched
+        self._in_flight: Optional[asyncio.Future] = None
+
+    def enqueue(self, events: List[ClassroomChangeEvent]) -> bool:
+        """Enqueue all events or none; False means the queue is full"""
+        if self.queue.maxsize and self.queue.qsize() + len(events) > self.queue.maxsize:
+            return False
+        for event in events:
+            self.queue.put_nowait(event)
+        return True
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stop the consumer, let the in-flight batch finish and flush the rest"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._in_flight is not None:
+            await self._in_flight
+            self._in_flight = None
+        pending, self._collecting = self._collecting, []
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        if pending:
+            await self.apply(pending)
+        await self.api.aclose()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._collecting = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(self._collecting) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._collecting.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            batch, self._collecting = self._collecting, []
+            # Shielded so cancelling the consumer on shutdown doesn't abort a write
+            self._in_flight = asyncio.ensure_future(self.apply(batch))
+            await asyncio.shield(self._in_flight)
+            self._in_flight = None
+
+    @staticmethod
+    def coalesce(events: List[ClassroomChangeEvent]) -> Dict[str, List[ClassroomChangeEvent]]:
+        """Keep the latest event per resource, grouped by course"""
+        latest: Dict[str, ClassroomChangeEvent] = {}
+        for event in events:
+            latest.pop(event.key, None)  # re-insert so order follows the latest event
+            latest[event.key] = event
+        by_course: Dict[str, List[ClassroomChangeEvent]] = {}
+        for event in latest.values():
+            by_course.setdefault(event.course_id, []).append(event)
+        return by_course
+
+    async def apply(self, events: List[ClassroomChangeEvent]):
+        """Apply a batch course by course, concurrently; one failing course never blocks the others"""
+        await asyncio.gather(*(
+            self.apply_course_with_retry(course_id, course_events)
+            for course_id, course_events in self.coalesce(events).items()
+        ))
+
+    async def apply_course_with_retry(self, course_id: str, events: List[ClassroomChangeEvent]):
+        """Apply one course's events, retrying with backoff, then dead-letter them"""
+        for attempt in range(self.max_attempts):
+            try:
+                await self.apply_course(course_id, events)
+                return
+            except Exception:
+                logger.exception("Failed to apply %d classroom events for course %s (attempt %d/%d)",
+                                 len(events), course_id, attempt + 1, self.max_attempts)
+                if attempt + 1 < self.max_attempts:
+                    await asyncio.sleep(self.retry_delay * 2 ** attempt)
+        await self.dead_letter(events)
+
+    async def dead_letter(self, events: List[ClassroomChangeEvent]):
+        try:
+            await db.classroom_failed_events.insert_many([
+                prepare_for_mongo({'event': event.model_dump(), 'failed_at': datetime.now(timezone.utc)})
+                for event in events
+            ])
+        except Exception:
+            # Last resort: keep the events in the logs so they can be replayed by hand
+            logger.exception("Dropping classroom events: %s",
+                             json.dumps([event.model_dump(mode='json') for event in events]))
+
+    async def apply_course(self, course_id: str, events: List[ClassroomChangeEvent]):
+        """Resolve and write one course's events with one bulk_write per collection"""
+        from pymongo import DeleteOne
+
+        classroom = await db.classrooms.find_one(
+            {'google_classroom_id': course_id},
+            {'_id': 0, 'id': 1, 'cohort_id': 1}
+        )
+        if classroom is None:
+            await self.park([(event, "course not synced") for event in events])
+            return
+        cohort_id = classroom.get('cohort_id', DEFAULT_COHORT_ID)
+        resources = await self.fetch_resources(events)
+        parked: List[Tuple[ClassroomChangeEvent, str]] = []
+        done: List[ClassroomChangeEvent] = []
+
+        def resolved(event: ClassroomChangeEvent) -> Optional[Dict[str, Any]]:
+            """The event's resource, or None after parking/skipping it"""
+            resource, reason = resources[event.key]
+            if reason:
+                parked.append((event, reason))
+            elif resource is None:
+                done.append(event)  # deleted on Google's side since the notification
+            return resource if not reason else None
+
+        # Assignments first so submissions in the same batch can resolve them
+        assignment_operations = []
+        for event in [event for event in events if event.collection == "courses.courseWork"]:
+            selector = {'cohort_id': cohort_id, 'google_assignment_id': event.resource_id}
+            if event.event_type == 'DELETED':
+                assignment_operations.append(DeleteOne(selector))
+                done.append(event)
+                continue
+            resource = resolved(event)
+            if resource is None:
+                continue
+            try:
+                fields = assignment_fields(resource, classroom['id'])
+            except (KeyError, TypeError, ValueError):
+                parked.append((event, "invalid resource"))
+                continue
+            if not fields['title']:
+                parked.append((event, "incomplete resource"))
+                continue
+            assignment_operations.append(self.upsert(selector, fields, event))
+            done.append(event)
+        if assignment_operations:
+            await db.assignments.bulk_write(assignment_operations, ordered=False)
+
+        submission_events = [event for event in events if event.collection == "courses.courseWork.studentSubmissions"]
+        submission_resources = {
+            event.key: resources[event.key][0] for event in submission_events
+            if event.event_type != 'DELETED' and resources[event.key][0] is not None
+        }
+        assignment_ids = await self.resolve_assignments(cohort_id, {
+            resource.get('courseWorkId') for resource in submission_resources.values()
+        })
+        student_ids = await self.resolve_students(cohort_id, {
+            resource.get('userId') for resource in submission_resources.values()
+        })
+        submission_operations = []
+        for event in submission_events:
+            selector = {'cohort_id': cohort_id, 'google_submission_id': event.resource_id}
+            if event.event_type == 'DELETED':
+                submission_operations.append(DeleteOne(selector))
+                done.append(event)
+                continue
+            resource = resolved(event)
+            if resource is None:
+                continue
+            assignment_id = assignment_ids.get(resource.get('courseWorkId') or event.course_work_id)
+            if assignment_id is None:
+                parked.append((event, "assignment not synced"))
+                continue
+            student_id = student_ids.get(resource.get('userId'))
+            if student_id is None:
+                parked.append((event, "student not found"))
+                continue
+            try:
+                fields = submission_fields(resource, assignment_id, student_id)
+            except (KeyError, TypeError, ValueError):
+                parked.append((event, "invalid resource"))
+                continue
+            if not fields['state']:
+                parked.append((event, "incomplete resource"))
+                continue
+            submission_operations.append(self.upsert(selector, fields, event))
+            done.append(event)
+        if submission_operations:
+            await db.submissions.bulk_write(submission_operations, ordered=False)
+
+        if parked:
+            await self.park(parked)
+        if done:
+            await db.classroom_pending_events.delete_many({'_id': {'$in': [event.key for event in done]}})
+        if assignment_operations:
+            # Only submissions waiting on an assignment can resolve because of this write
+            await self.requeue_pending({
+                'event.course_id': course_id,
+                'reason': "assignment not synced",
+                '_id': {'$nin': [event.key for event in events]}
+            })
+
+    async def fetch_resources(self, events: List[ClassroomChangeEvent]) -> Dict[str, Tuple[Optional[Dict[str, Any]], Optional[str]]]:
+        """Fetch resources notifications only referenced, concurrently: key -> (resource, park reason)"""
+        async def fetch(event: ClassroomChangeEvent):
+            if event.resource is not None:
+                return event.resource, None
+            if not self.api.configured:
+                return None, "resource not fetched"
+            if event.collection != "courses.courseWork" and not event.course_work_id:
+                return None, "courseWorkId missing"
+            try:
+                return await self.api.get_resource(event), None
+            except ClassroomApiError as e:
+                return None, f"classroom api {e.status_code}"
+
+        pending = [event for event in events if event.event_type != 'DELETED']
+        results = await asyncio.gather(*(fetch(event) for event in pending))
+        return {event.key: result for event, result in zip(pending, results)}
+
+    async def resolve_assignments(self, cohort_id: str, google_ids: set) -> Dict[str, str]:
+        """Map courseWork ids to our assignment ids with a single query"""
+        google_ids.discard(None)
+        if not google_ids:
+            return {}
+        assignments = await db.assignments.find(
+            {'cohort_id': cohort_id, 'google_assignment_id': {'$in': list(google_ids)}},
+            {'_id': 0, 'id': 1, 'google_assignment_id': 1}
+        ).to_list(length=None)
+        return {assignment['google_assignment_id']: assignment['id'] for assignment in assignments}
+
+    async def resolve_students(self, cohort_id: str, google_user_ids: set) -> Dict[str, str]:
+        """Map Classroom userIds to our user ids, linking unknown ones by profile email"""
+        from pymongo import UpdateOne
+
+        google_user_ids.discard(None)
+        if not google_user_ids:
+            return {}
+        users = await db.users.find(
+            {'cohort_id': cohort_id, 'google_user_id': {'$in': list(google_user_ids)}},
+            {'_id': 0, 'id': 1, 'google_user_id': 1}
+        ).to_list(length=None)
+        student_ids = {user['google_user_id']: user['id'] for user in users}
+        unknown = [user_id for user_id in google_user_ids if user_id not in student_ids]
+        if not unknown or not self.api.configured:
+            return student_ids
+
+        async def email_for(user_id: str) -> Optional[str]:
+            try:
+                return await self.api.get_user_email(user_id)
+            except ClassroomApiError:
+                return None
+
+        emails = dict(zip(unknown, await asyncio.gather(*(email_for(user_id) for user_id in unknown))))
+        emails = {user_id: email for user_id, email in emails.items() if email}
+        if not emails:
+            return student_ids
+        users = await db.users.find(
+            {'cohort_id': cohort_id, 'email': {'$in': list(emails.values())}},
+            {'_id': 0, 'id': 1, 'email': 1}
+        ).to_list(length=None)
+        ids_by_email = {user['email']: user['id'] for user in users}
+        links = []
+        for google_user_id, email in emails.items():
+            if email in ids_by_email:
+                student_ids[google_user_id] = ids_by_email[email]
+                links.append(UpdateOne(
+                    {'cohort_id': cohort_id, 'id': ids_by_email[email]},
+                    {'$set': {'google_user_id': google_user_id}}
+                ))
+        if links:
+            await db.users.bulk_write(links, ordered=False)
+        return student_ids
+
+    @staticmethod
+    def upsert(selector: Dict[str, Any], fields: Dict[str, Any], event: ClassroomChangeEvent):
+        from pymongo import UpdateOne
+
+        fields = {**fields, 'google_classroom_id': event.course_id, 'synced_at': event.received_at}
+        return UpdateOne(
+            selector,
+            {
+                '$set': prepare_for_mongo(fields),
+                '$setOnInsert': prepare_for_mongo({
+                    'id': str(uuid.uuid4()),
+                    'created_at': datetime.now(timezone.utc)
+                })
+            },
+            upsert=True
+        )
+
+    async def park(self, parked: List[Tuple[ClassroomChangeEvent, str]]):
+        """Keep the latest unresolved event per resource for a later retry"""
+        from pymongo import UpdateOne
+
+        await db.classroom_pending_events.bulk_write([
+            UpdateOne(
+                {'_id': event.key},
+                {'$set': prepare_for_mongo({
+                    'event': event.model_dump(),
+                    'reason': reason,
+                    'parked_at': datetime.now(timezone.utc)
+                })},
+                upsert=True
+            )
+            for event, reason in parked
+        ], ordered=False)
+
+    async def requeue_pending(self, filter: Optional[Dict[str, Any]] = None) -> int:
+        """Put parked events back on the queue, e.g. after their course or assignment synced"""
+        docs = await db.classroom_pending_events.find(filter or {}, {'_id': 0, 'event': 1}).to_list(length=None)
+        events = [ClassroomChangeEvent(**doc['event']) for doc in docs]
+        if events and not self.enqueue(events):
+            logger.warning("Queue full, leaving %d classroom events parked", len(events))
+            return 0
+        return len(events)
+
+classroom_event_batcher = ClassroomEventBatcher()
+
+@api_router.post("/webhooks/classroom", status_code=202)
+async def receive_classroom_events(request: Request, token: Optional[str] = None):
+    """Validate and enqueue Classroom change notifications, acknowledging immediately"""
+    expected_token = os.environ.get('CLASSROOM_WEBHOOK_TOKEN')
+    if not expected_token:
+        # Fail closed: without a token anyone could write to Mongo through here
+        logger.error("CLASSROOM_WEBHOOK_TOKEN is not set; rejecting Classroom notifications")
+        raise HTTPException(status_code=503, detail="Classroom webhook is not configured")
+    if not hmac.compare_digest((token or '').encode(), expected_token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid webhook token")
+    
+    try:
+        events = parse_classroom_push(await request.json())
+    except (ValueError, KeyError, TypeError, AttributeError, ValidationError):
+        raise HTTPException(status_code=400, detail="Invalid event payload")
+    
+    # Acknowledge collections we don't store so Pub/Sub doesn't redeliver them
+    supported = [event for event in events if event.collection in CLASSROOM_COLLECTIONS]
+    if not classroom_event_batcher.enqueue(supported):
+        raise HTTPException(status_code=503, detail="Ingestion queue full", headers={"Retry-After": "5"})
+    
+    return {"accepted": len(supported), "ignored": len(events) - len(supported)}
+
 # Include the router in the main app
 app.include_router(api_router)
 
+# Innermost, so it times the handler rather than rate limiting or compression
+app.add_middleware(TenantMetricsMiddleware)
+
+# Rate limiting runs inside CORS so rejected responses still carry CORS headers
+rate_limit_backend = MongoRateLimitBackend() if os.environ.get('RATE_LIMIT_BACKEND') == 'mongo' else InMemoryRateLimitBackend()
+if os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() != 'false':
+    app.add_middleware(RateLimitMiddleware, backend=rate_limit_backend)
+
+app.add_middleware(CompressionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -402,6 +1717,146 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def setup_database():
+    """Prepare the database before the app serves requests or the batcher writes"""
+    # Blocking on purpose: until the cohort backfill and tenant indexes are in
+    # place, tenant-scoped queries miss legacy documents and upserts can race
+    # the unique indexes. A failure here aborts startup.
+    await ensure_tenant_indexes()
+    if os.environ.get('MONGO_SHARDING', 'false').lower() == 'true':
+        try:
+            await shard_tenant_collections()
+        except Exception:
+            logger.exception("Sharding tenant collections failed")
+    if isinstance(rate_limit_backend, MongoRateLimitBackend):
+        try:
+            await rate_limit_backend.ensure_indexes()
+        except Exception:
+            logger.exception("Creating rate limit indexes failed")
+    try:
+        await classroom_event_batcher.requeue_pending()
+    except Exception:
+        logger.exception("Requeueing parked classroom events failed")
+
+@app.on_event("startup")
+async def start_classroom_event_batcher():
+    classroom_event_batcher.start()
+
+@app.on_event("shutdown")
+async def stop_classroom_event_batcher():
+    await classroom_event_batcher.stop()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    if _client is not None:
+        _client.close()
+
+# Startup profiling
+STARTUP_PROBE = '''
+import asyncio, json, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+
+async def first_request():
+    messages = []
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+    async def send(message):
+        messages.append(message)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': '/api/health', 'raw_path': b'/api/health', 'root_path': '',
+        'query_string': b'', 'headers': [], 'client': ('127.0.0.1', 0), 'server': ('127.0.0.1', 8001),
+    }
+    await server.app(scope, receive, send)
+    return messages[0]['status']
+
+async def first_db_request():
+    # The first DB-backed request also pays for the lazy Motor import and client
+    start = time.perf_counter()
+    database = server.db.get()
+    initialized = time.perf_counter()
+    try:
+        await database.command('ping')
+    except Exception as e:
+        return (initialized - start) * 1000, None, type(e).__name__
+    return (initialized - start) * 1000, (time.perf_counter() - initialized) * 1000, None
+
+status = asyncio.run(first_request())
+done = time.perf_counter()
+db_init_ms, db_ping_ms, db_error = asyncio.run(first_db_request())
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_request_ms': (done - imported) * 1000,
+    'status': status,
+    'db_init_ms': db_init_ms,
+    'db_ping_ms': db_ping_ms,
+    'db_error': db_error,
+}))
+'''
+
+def profile_startup(top: int = 15) -> Dict[str, Any]:
+    """Import the app in a fresh interpreter and time imports, the first request and DB init"""
+    import subprocess
+    import sys
+
+    env = {
+        'MONGO_URL': 'mongodb://localhost:27017',
+        'DB_NAME': 'startup_profile',
+        **os.environ,
+        # Don't wait 30s for server selection when no MongoDB is reachable
+        'MONGO_SERVER_SELECTION_TIMEOUT_MS': '2000',
+    }
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_PROBE],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append({
+            'module': name.strip(),
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000
+        })
+    modules.sort(key=lambda module: module['cumulative_ms'], reverse=True)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['time_to_first_request_ms'] = report['import_ms'] + report['first_request_ms']
+    # Cold start cost up to a first DB-backed request, excluding the network round trip
+    report['time_to_first_db_request_ms'] = report['time_to_first_request_ms'] + report['db_init_ms']
+    report['modules'] = modules[:top]
+    return report
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Semillero Digital - Classroom Enhancer API")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="report import time per module and time to first request, then exit")
+    parser.add_argument("--top", type=int, default=15, help="modules to list with --profile-startup")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        report = profile_startup(args.top)
+        print(f"Import: {report['import_ms']:.1f}ms")
+        print(f"First request: {report['first_request_ms']:.1f}ms (status {report['status']})")
+        print(f"Time to first request: {report['time_to_first_request_ms']:.1f}ms")
+        print(f"DB init (Motor import + client): {report['db_init_ms']:.1f}ms")
+        if report['db_ping_ms'] is None:
+            print(f"DB ping: unavailable ({report['db_error']})")
+        else:
+            print(f"DB ping: {report['db_ping_ms']:.1f}ms")
+        print(f"Time to first DB-backed request: {report['time_to_first_db_request_ms']:.1f}ms")
+        print(f"\n{'cumulative':>12} {'self':>10}  module")
+        for module in report['modules']:
+            print(f"{module['cumulative_ms']:>10.1f}ms {module['self_ms']:>8.1f}ms  {module['module']}")
+    else:
+        import uvicorn
+
+        uvicorn.run(app, host=args.host, port=args.port)
\ No newline at end of file
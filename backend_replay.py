@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Classroom Event Replayer for Semillero Digital Classroom Enhancer
+Replays Classroom change notifications against /api/webhooks/classroom
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+import requests
+
+# Configuration
+BASE_URL = "http://localhost:8001/api"
+
+def load_events(path):
+    """Read one Classroom notification per line from a JSONL file"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def generate_events(courses, count):
+    """Synthesize a burst of coursework and submission changes"""
+    events = []
+    for i in range(count):
+        course_id = f"course{random.randrange(courses)}"
+        coursework_id = f"{course_id}-cw{random.randrange(20)}"
+        if i % 4 == 0:
+            events.append({
+                "collection": "courses.courseWork",
+                "eventType": "MODIFIED",
+                "resourceId": {"courseId": course_id, "id": coursework_id},
+                "resource": {"title": f"Tarea {coursework_id}", "maxPoints": 100},
+            })
+        else:
+            submission_id = f"{coursework_id}-sub{random.randrange(30)}"
+            events.append({
+                "collection": "courses.courseWork.studentSubmissions",
+                "eventType": "MODIFIED",
+                "resourceId": {"courseId": course_id, "courseWorkId": coursework_id, "id": submission_id},
+                "resource": {
+                    "courseWorkId": coursework_id,
+                    "userId": f"student{random.randrange(30)}",
+                    "state": random.choice(["CREATED", "TURNED_IN", "RETURNED"]),
+                },
+            })
+    return events
+
+def as_pubsub_envelope(event):
+    """Wrap a notification the way a Pub/Sub push subscription delivers it"""
+    return {
+        "message": {
+            "data": base64.b64encode(json.dumps(event).encode()).decode(),
+            "messageId": event.get("messageId") or str(uuid.uuid4()),
+        },
+        "subscription": "projects/local/subscriptions/classroom-replay",
+    }
+
+def replay(events, base_url, token=None, batch_size=1, pubsub=False):
+    session = requests.Session()
+    params = {"token": token} if token else None
+    url = f"{base_url}/webhooks/classroom"
+    latencies = []
+    accepted = ignored = rejected = 0
+
+    if pubsub:
+        bodies = [as_pubsub_envelope(event) for event in events]
+    else:
+        bodies = [events[i:i + batch_size] for i in range(0, len(events), batch_size)]
+
+    for body in bodies:
+        start = time.perf_counter()
+        response = session.post(url, json=body, params=params)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code == 202:
+            data = response.json()
+            accepted += data["accepted"]
+            ignored += data["ignored"]
+        else:
+            rejected += 1
+            print(f"[{response.status_code}] {response.text[:200]}")
+
+    latencies.sort()
+    print(f"Requests: {len(bodies)}, accepted events: {accepted}, ignored: {ignored}, rejected requests: {rejected}")
+    if latencies:
+        print(f"Ack latency p50: {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+              f"p99: {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms")
+    return rejected == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("events", nargs="?", help="JSONL file of Classroom notifications")
+    parser.add_argument("--generate", type=int, default=0, help="synthesize N events instead of reading a file")
+    parser.add_argument("--courses", type=int, default=5, help="courses to spread generated events over")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--token", default=os.environ.get("CLASSROOM_WEBHOOK_TOKEN"),
+                        help="CLASSROOM_WEBHOOK_TOKEN configured on the server (defaults to the env var)")
+    parser.add_argument("--batch-size", type=int, default=1, help="events per request")
+    parser.add_argument("--pubsub", action="store_true", help="send Pub/Sub push envelopes, one event each")
+    args = parser.parse_args()
+
+    if args.generate:
+        events = generate_events(args.courses, args.generate)
+    elif args.events:
+        events = load_events(args.events)
+    else:
+        parser.error("pass an events file or --generate N")
+
+    ok = replay(events, args.base_url, args.token, args.batch_size, args.pubsub)
+    sys.exit(0 if ok else 1)
@@ -6,9 +6,9 @@ dotenv.config();
 
 const app = express();
 
-app.use('/auth', createProxyMiddleware({ target: 'http://auth-service:4000', changeOrigin: true, pathRewrite: {'^/auth': '/api/auth'} }));
-app.use('/classroom', createProxyMiddleware({ target: 'http://classroom-service:4000', changeOrigin: true, pathRewrite: {'^/classroom': '/api/classroom'} }));
-app.use('/notifications', createProxyMiddleware({ target: 'http://notifications-service:4000', changeOrigin: true, pathRewrite: {'^/notifications': '/api/notifications'} }));
+app.use('/auth', createProxyMiddleware({ target: 'http://auth-service:4000', changeOrigin: true, xfwd: true, pathRewrite: {'^/auth': '/api/auth'} }));
+app.use('/classroom', createProxyMiddleware({ target: 'http://classroom-service:4000', changeOrigin: true, xfwd: true, pathRewrite: {'^/classroom': '/api/classroom'} }));
+app.use('/notifications', createProxyMiddleware({ target: 'http://notifications-service:4000', changeOrigin: true, xfwd: true, pathRewrite: {'^/notifications': '/api/notifications'} }));
 
 app.get('/health', (req, res) => res.json({ ok: true }));
 
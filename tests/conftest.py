@@ -0,0 +1,166 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# server.py lives in backend/ and is imported as a top-level module
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+def _lookup(doc, key):
+    value = doc
+    for part in key.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def matches(doc, filter):
+    """Equality plus the handful of operators the server uses"""
+    for key, expected in (filter or {}).items():
+        value = _lookup(doc, key)
+        if isinstance(expected, dict) and any(op.startswith("$") for op in expected):
+            if "$in" in expected and value not in expected["$in"]:
+                return False
+            if "$nin" in expected and value in expected["$nin"]:
+                return False
+            if "$exists" in expected and (key in doc) != expected["$exists"]:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+def project(doc, projection):
+    """Apply an inclusion projection ({field: 1}, optionally {'_id': 0})"""
+    if not projection:
+        return dict(doc)
+    included = [key for key, value in projection.items() if value and key != "_id"]
+    if not included:
+        return {key: value for key, value in doc.items() if projection.get(key, 1)}
+    result = {key: doc[key] for key in included if key in doc}
+    if projection.get("_id", 1) and "_id" in doc:
+        result["_id"] = doc["_id"]
+    return result
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class FakeCollection:
+    """Just enough of a Motor collection for server.py, recording every query"""
+
+    def __init__(self, docs=None):
+        self.docs = [dict(doc) for doc in docs or []]
+        self.queries = []
+        self.indexes = {"_id_": {}}
+
+    def find(self, filter=None, projection=None, session=None):
+        self.queries.append(("find", filter, projection))
+        return FakeCursor([project(doc, projection) for doc in self.docs if matches(doc, filter)])
+
+    async def find_one(self, filter=None, projection=None, session=None):
+        self.queries.append(("find_one", filter, projection))
+        for doc in self.docs:
+            if matches(doc, filter):
+                return project(doc, projection)
+        return None
+
+    async def find_one_and_update(self, filter, update, session=None):
+        for doc in self.docs:
+            if matches(doc, filter):
+                before = dict(doc)
+                doc.update(update.get("$set", {}))
+                return before
+        return None
+
+    async def insert_one(self, document, session=None):
+        self.docs.append(dict(document))
+
+    async def insert_many(self, documents, session=None):
+        self.docs.extend(dict(doc) for doc in documents)
+
+    async def update_one(self, filter, update, upsert=False, session=None):
+        for doc in self.docs:
+            if matches(doc, filter):
+                doc.update(update.get("$set", {}))
+                return SimpleNamespace(matched_count=1)
+        if upsert:
+            plain = {key: value for key, value in filter.items() if not isinstance(value, dict)}
+            self.docs.append({**plain, **update.get("$setOnInsert", {}), **update.get("$set", {})})
+        return SimpleNamespace(matched_count=0)
+
+    async def update_many(self, filter, update, session=None):
+        matched = [doc for doc in self.docs if matches(doc, filter)]
+        for doc in matched:
+            doc.update(update.get("$set", {}))
+        return SimpleNamespace(matched_count=len(matched))
+
+    async def delete_one(self, filter, session=None):
+        for doc in self.docs:
+            if matches(doc, filter):
+                self.docs.remove(doc)
+                return
+
+    async def delete_many(self, filter, session=None):
+        self.docs = [doc for doc in self.docs if not matches(doc, filter)]
+
+    async def bulk_write(self, operations, ordered=True, session=None):
+        self.queries.append(("bulk_write", len(operations), None))
+        for operation in operations:
+            if hasattr(operation, "_doc"):
+                await self.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+            else:
+                await self.delete_one(operation._filter)
+
+    async def create_index(self, keys, **options):
+        self.indexes["_".join(f"{key}_{direction}" for key, direction in keys)] = options
+
+
+class FakeTransaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeSession(FakeTransaction):
+    def start_transaction(self):
+        return FakeTransaction()
+
+
+class FakeClient:
+    async def start_session(self):
+        return FakeSession()
+
+
+class FakeDatabase:
+    name = "test"
+
+    def __init__(self):
+        self.collections = {}
+        self.client = FakeClient()
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self[name]
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Swap server.db for in-memory collections"""
+    database = FakeDatabase()
+    monkeypatch.setattr(server, "db", database)
+    return database
@@ -0,0 +1,232 @@
+import asyncio
+import base64
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+TOKEN = "test-webhook-token"
+
+
+def notification(collection="courses.courseWork", event_type="MODIFIED", resource_id="cw1",
+                 course_id="course1", resource=None, **resource_ids):
+    body = {
+        "collection": collection,
+        "eventType": event_type,
+        "resourceId": {"courseId": course_id, "id": resource_id, **resource_ids},
+    }
+    if resource is not None:
+        body["resource"] = resource
+    return body
+
+
+class FakeClassroomApi:
+    def __init__(self, resources=None, emails=None, failures=None):
+        self.resources = resources or {}
+        self.emails = emails or {}
+        self.failures = failures or {}  # resource id -> exception to raise
+        self.configured = True
+
+    async def get_resource(self, event):
+        if event.resource_id in self.failures:
+            raise self.failures[event.resource_id]
+        return self.resources.get(event.resource_id)
+
+    async def get_user_email(self, user_id):
+        return self.emails.get(user_id)
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def classroom_db(fake_db):
+    fake_db.classrooms.docs.append({"id": "class-1", "google_classroom_id": "course1", "cohort_id": "c1"})
+    fake_db.users.docs.append({"id": "user-1", "email": "ana@example.com", "cohort_id": "c1"})
+    return fake_db
+
+
+@pytest.fixture
+def batcher(monkeypatch):
+    batcher = server.ClassroomEventBatcher(retry_delay=0)
+    monkeypatch.setattr(server, "classroom_event_batcher", batcher)
+    return batcher
+
+
+@pytest.fixture
+def client(monkeypatch, batcher):
+    monkeypatch.setenv("CLASSROOM_WEBHOOK_TOKEN", TOKEN)
+    monkeypatch.setattr(server, "validated_sessions", server.OrderedDict())
+    # Skip rate limiting so repeated posts from the test client aren't throttled
+    monkeypatch.setattr(server.InMemoryRateLimitBackend, "hit", lambda self, key, limit: asyncio.sleep(0, 0.0))
+    return TestClient(server.app)
+
+
+def post(client, body, token=TOKEN):
+    return client.post("/api/webhooks/classroom", params={"token": token}, json=body)
+
+
+def test_accepts_notifications_and_enqueues(client, batcher):
+    response = post(client, [notification(), notification(collection="courses.students")])
+    assert response.status_code == 202
+    assert response.json() == {"accepted": 1, "ignored": 1}
+    assert batcher.queue.qsize() == 1
+
+
+def test_accepts_pubsub_envelope(client, batcher):
+    envelope = {"message": {"data": base64.b64encode(json.dumps(notification()).encode()).decode(),
+                            "messageId": "m-1"}}
+    response = post(client, envelope)
+    assert response.status_code == 202
+    assert batcher.queue.get_nowait().event_id == "m-1"
+
+
+@pytest.mark.parametrize("body", [
+    ["x"],
+    "str",
+    {"collection": "courses.courseWork", "eventType": "MODIFIED", "resourceId": "abc"},
+    {"message": {"data": base64.b64encode(b"[1]").decode()}},
+    {"message": {"data": "not base64!"}},
+    {"message": "x"},
+    notification(event_type="X"),
+    {"collection": "courses.courseWork"},
+])
+def test_malformed_bodies_return_400(client, batcher, body):
+    assert post(client, body).status_code == 400
+    assert batcher.queue.empty()
+
+
+def test_wrong_token_rejected(client):
+    assert post(client, notification(), token="nope").status_code == 401
+
+
+def test_fails_closed_without_configured_token(client, monkeypatch):
+    monkeypatch.delenv("CLASSROOM_WEBHOOK_TOKEN")
+    assert post(client, notification()).status_code == 503
+
+
+def test_coalesce_keeps_latest_event_per_resource_grouped_by_course():
+    events = [
+        server.parse_classroom_event(notification(resource_id="cw1", resource={"title": "v1"})),
+        server.parse_classroom_event(notification(resource_id="cw2", course_id="course2")),
+        server.parse_classroom_event(notification(resource_id="cw1", resource={"title": "v2"})),
+    ]
+    by_course = server.ClassroomEventBatcher.coalesce(events)
+    assert set(by_course) == {"course1", "course2"}
+    assert [event.resource["title"] for event in by_course["course1"]] == ["v2"]
+
+
+def submission_events():
+    return [
+        server.parse_classroom_event(notification(resource_id="cw1")),
+        server.parse_classroom_event(notification(
+            collection="courses.courseWork.studentSubmissions", resource_id="sub1", courseWorkId="cw1"
+        )),
+    ]
+
+
+def test_apply_resolves_ids_and_is_idempotent(classroom_db):
+    api = FakeClassroomApi(
+        resources={
+            "cw1": {"id": "cw1", "title": "HTML Básico", "maxPoints": 100},
+            "sub1": {"id": "sub1", "courseWorkId": "cw1", "userId": "g-42", "state": "TURNED_IN",
+                     "updateTime": "2025-01-27T10:30:00Z"},
+        },
+        emails={"g-42": "ana@example.com"},
+    )
+    batcher = server.ClassroomEventBatcher(api=api)
+    asyncio.run(batcher.apply(submission_events()))
+    first_ids = [doc["id"] for doc in classroom_db.assignments.docs + classroom_db.submissions.docs]
+    asyncio.run(batcher.apply(submission_events()))
+
+    assert len(classroom_db.assignments.docs) == 1
+    assert len(classroom_db.submissions.docs) == 1
+    assert [doc["id"] for doc in classroom_db.assignments.docs + classroom_db.submissions.docs] == first_ids
+
+    assignment = server.Assignment(**server.parse_from_mongo(dict(classroom_db.assignments.docs[0])))
+    submission = server.Submission(**server.parse_from_mongo(dict(classroom_db.submissions.docs[0])))
+    assert assignment.classroom_id == "class-1"
+    assert submission.assignment_id == assignment.id
+    assert submission.student_id == "user-1"
+    assert classroom_db.users.docs[0]["google_user_id"] == "g-42"
+    assert classroom_db.classroom_pending_events.docs == []
+
+
+def test_unresolvable_events_are_parked_not_stubbed(classroom_db):
+    batcher = server.ClassroomEventBatcher(api=server.ClassroomApiClient(access_token=""))
+    asyncio.run(batcher.apply(submission_events() + [
+        server.parse_classroom_event(notification(resource_id="cw9", course_id="unknown-course")),
+    ]))
+    assert classroom_db.assignments.docs == []
+    assert classroom_db.submissions.docs == []
+    reasons = {doc["_id"]: doc["reason"] for doc in classroom_db.classroom_pending_events.docs}
+    assert reasons == {
+        "courses.courseWork:cw1": "resource not fetched",
+        "courses.courseWork.studentSubmissions:sub1": "resource not fetched",
+        "courses.courseWork:cw9": "course not synced",
+    }
+
+
+def test_failing_course_is_dead_lettered_without_blocking_others(classroom_db):
+    classroom_db.classrooms.docs.append({"id": "class-2", "google_classroom_id": "course2", "cohort_id": "c1"})
+    api = FakeClassroomApi(
+        resources={"cw1": {"id": "cw1", "title": "HTML Básico"}},
+        failures={"cw2": RuntimeError("classroom unavailable")},
+    )
+    batcher = server.ClassroomEventBatcher(max_attempts=2, retry_delay=0, api=api)
+    asyncio.run(batcher.apply([
+        server.parse_classroom_event(notification(resource_id="cw1")),
+        server.parse_classroom_event(notification(resource_id="cw2", course_id="course2")),
+    ]))
+    assert [doc["google_assignment_id"] for doc in classroom_db.assignments.docs] == ["cw1"]
+    assert [doc["event"]["resource_id"] for doc in classroom_db.classroom_failed_events.docs] == ["cw2"]
+
+
+def test_client_errors_park_the_event(classroom_db):
+    api = FakeClassroomApi(
+        resources={"cw1": {"id": "cw1", "title": "HTML Básico"}},
+        failures={"sub1": server.ClassroomApiError(403)},
+    )
+    batcher = server.ClassroomEventBatcher(api=api)
+    asyncio.run(batcher.apply(submission_events()))
+    assert len(classroom_db.assignments.docs) == 1
+    assert classroom_db.classroom_failed_events.docs == []
+    reasons = {doc["_id"]: doc["reason"] for doc in classroom_db.classroom_pending_events.docs}
+    assert reasons == {"courses.courseWork.studentSubmissions:sub1": "classroom api 403"}
+
+
+def test_assignment_sync_only_requeues_submissions_waiting_on_it(classroom_db):
+    parked = [
+        (server.parse_classroom_event(notification(
+            collection="courses.courseWork.studentSubmissions", resource_id=resource_id, courseWorkId="cw1"
+        )), reason)
+        for resource_id, reason in [("sub1", "assignment not synced"), ("sub2", "student not found")]
+    ]
+    batcher = server.ClassroomEventBatcher(api=FakeClassroomApi(resources={"cw1": {"id": "cw1", "title": "HTML"}}))
+    asyncio.run(batcher.park(parked))
+    asyncio.run(batcher.apply([server.parse_classroom_event(notification(resource_id="cw1"))]))
+    assert [batcher.queue.get_nowait().resource_id] == ["sub1"]
+    assert batcher.queue.empty()
+
+
+def test_stop_finishes_in_flight_and_queued_batches():
+    applied = []
+
+    async def scenario():
+        batcher = server.ClassroomEventBatcher(flush_interval=0)
+
+        async def slow_apply(events):
+            await asyncio.sleep(0.05)
+            applied.extend(events)
+
+        batcher.apply = slow_apply
+        batcher.start()
+        batcher.enqueue(submission_events()[:1])
+        await asyncio.sleep(0.01)  # first batch is now in flight
+        batcher.enqueue(submission_events()[1:])
+        await batcher.stop()
+
+    asyncio.run(scenario())
+    assert [event.resource_id for event in applied] == ["cw1", "sub1"]
@@ -0,0 +1,141 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+import server
+
+
+async def ok(request):
+    return JSONResponse({"ok": True})
+
+
+def make_client(route_limits, concurrency=None, client=("203.0.113.7", 50000)):
+    app = Starlette(routes=[
+        Route("/api/auth/session", ok, methods=["POST"]),
+        Route("/api/notifications", ok),
+    ])
+    limited = server.RateLimitMiddleware(app, route_limits=route_limits, concurrency=concurrency or {})
+
+    async def from_client(scope, receive, send):
+        await limited({**scope, "client": client}, receive, send)
+
+    return TestClient(from_client)
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limit_state(monkeypatch, fake_db):
+    server.validated_sessions.clear()
+    monkeypatch.setattr(server, "TRUSTED_PROXIES", [])
+    yield
+    server.validated_sessions.clear()
+
+
+def test_token_bucket_allows_budget_then_returns_retry_after():
+    backend = server.InMemoryRateLimitBackend()
+    limit = server.RateLimit(requests=3, period=60)
+
+    async def hits():
+        return [await backend.hit("key", limit) for _ in range(4)]
+
+    results = asyncio.run(hits())
+    assert results[:3] == [0.0, 0.0, 0.0]
+    assert 0 < results[3] <= 20
+
+
+def test_429_with_retry_after_header():
+    client = make_client({"/api/notifications": server.RateLimit(requests=2, period=60)})
+    assert client.get("/api/notifications").status_code == 200
+    assert client.get("/api/notifications").status_code == 200
+    response = client.get("/api/notifications")
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+
+def test_made_up_session_tokens_share_the_ip_bucket():
+    client = make_client({"/api/auth/session": server.RateLimit(requests=5, period=60)})
+    statuses = [
+        client.post("/api/auth/session", cookies={"session_token": str(uuid.uuid4())}).status_code
+        for _ in range(10)
+    ]
+    assert statuses[:5] == [200] * 5
+    assert set(statuses[5:]) == {429}
+
+
+def test_validated_session_gets_its_own_bucket():
+    client = make_client({"/api/notifications": server.RateLimit(requests=1, period=60)})
+    server.remember_validated_session("valid-token", datetime.now(timezone.utc) + timedelta(days=1))
+    assert client.get("/api/notifications").status_code == 200
+    assert client.get("/api/notifications").status_code == 429
+    response = client.get("/api/notifications", headers={"Cookie": "session_token=valid-token"})
+    assert response.status_code == 200
+
+
+def test_session_validated_by_another_worker_is_checked_in_mongo(fake_db):
+    client = make_client({"/api/notifications": server.RateLimit(requests=1, period=60)})
+    expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+    fake_db.user_sessions.docs.append({"session_token": "valid-token", "user_id": "u1",
+                                       "expires_at": expires_at.isoformat()})
+    assert client.get("/api/notifications").status_code == 200
+    response = client.get("/api/notifications", headers={"Cookie": "session_token=valid-token"})
+    assert response.status_code == 200
+    # Raw tokens are never kept in memory or used as bucket keys
+    assert list(server.validated_sessions) == [server.hash_session_token("valid-token")]
+
+
+def test_auth_routes_are_keyed_by_ip_even_with_a_validated_session():
+    client = make_client({"/api/auth/session": server.RateLimit(requests=1, period=60)})
+    server.remember_validated_session("valid-token", datetime.now(timezone.utc) + timedelta(days=1))
+    assert client.post("/api/auth/session").status_code == 200
+    response = client.post("/api/auth/session", headers={"Cookie": "session_token=valid-token"})
+    assert response.status_code == 429
+
+
+def test_forwarded_for_ignored_from_untrusted_peers():
+    client = make_client({"/api/notifications": server.RateLimit(requests=1, period=60)})
+    assert client.get("/api/notifications", headers={"X-Forwarded-For": "198.51.100.1"}).status_code == 200
+    response = client.get("/api/notifications", headers={"X-Forwarded-For": "198.51.100.2"})
+    assert response.status_code == 429
+
+
+def test_forwarded_for_honoured_from_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(server, "TRUSTED_PROXIES", server.parse_trusted_proxies("10.0.0.0/8"))
+    client = make_client({"/api/notifications": server.RateLimit(requests=1, period=60)}, client=("10.0.0.1", 50000))
+    assert client.get("/api/notifications", headers={"X-Forwarded-For": "198.51.100.1"}).status_code == 200
+    assert client.get("/api/notifications", headers={"X-Forwarded-For": "198.51.100.2"}).status_code == 200
+    response = client.get("/api/notifications", headers={"X-Forwarded-For": "198.51.100.1, 10.0.0.1"})
+    assert response.status_code == 429
+
+
+def test_private_ranges_are_trusted_by_default(monkeypatch):
+    # The api-gateway reaches the app over the compose network
+    monkeypatch.setattr(server, "TRUSTED_PROXIES", server.parse_trusted_proxies(server.DEFAULT_TRUSTED_PROXIES))
+    assert server.is_trusted_proxy("172.18.0.5")
+    assert not server.is_trusted_proxy("203.0.113.7")
+    assert not server.is_trusted_proxy("testclient")
+
+
+def test_concurrency_cap_returns_503_with_retry_after():
+    client = make_client({"/api/": server.RateLimit(requests=100, period=60)}, concurrency={"read": 0})
+    response = client.get("/api/notifications")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_eviction_keeps_active_buckets():
+    backend = server.InMemoryRateLimitBackend(max_keys=10)
+    limit = server.RateLimit(requests=2, period=3600)
+
+    async def fill():
+        await backend.hit("active", limit)
+        await backend.hit("active", limit)
+        for i in range(20):
+            await backend.hit(f"sprayed-{i}", server.RateLimit(requests=1, period=0.000001))
+        return await backend.hit("active", limit)
+
+    assert asyncio.run(fill()) > 0
@@ -0,0 +1,115 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import server
+
+LARGE = {"items": ["x" * 50] * 40}
+
+
+async def large(request):
+    return JSONResponse(LARGE, headers={"Vary": "Cookie"})
+
+
+async def small(request):
+    return JSONResponse({"ok": True})
+
+
+async def image(request):
+    return Response(b"\x89PNG" + b"0" * 2000, media_type="image/png")
+
+
+async def stream(request):
+    async def chunks():
+        for i in range(5):
+            yield f"line {i} ".encode() * 100
+
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+def make_client(minimum_size=500):
+    app = Starlette(routes=[
+        Route("/large", large), Route("/small", small),
+        Route("/image", image), Route("/stream", stream),
+    ])
+    return TestClient(server.CompressionMiddleware(app, minimum_size=minimum_size))
+
+
+def test_large_response_is_gzipped_and_vary_merged():
+    response = make_client().get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == LARGE
+    assert response.headers.get_list("vary") == ["Cookie, Accept-Encoding"]
+    assert int(response.headers["content-length"]) < len(str(LARGE))
+
+
+def test_small_response_is_left_alone():
+    response = make_client().get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"ok": True}
+
+
+def test_uncompressible_content_type_passes_through():
+    response = make_client().get("/image", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.content.startswith(b"\x89PNG")
+
+
+def test_streaming_response_is_compressed_incrementally():
+    client = make_client(minimum_size=10)
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == "".join(f"line {i} " * 100 for i in range(5))
+
+
+def test_identity_when_gzip_refused():
+    response = make_client().get("/large", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in response.headers
+
+
+@pytest.fixture
+def coordinator(monkeypatch):
+    async def fake_user(request, credentials=None):
+        return server.User(email="coordinator@example.com", name="Coordinator", role="coordinator")
+
+    monkeypatch.setattr(server, "get_current_user", fake_user)
+
+
+def test_unknown_sparse_field_returns_400(coordinator):
+    response = TestClient(server.app).get("/api/classrooms?fields=name,bogus")
+    assert response.status_code == 400
+    assert "bogus" in response.json()["detail"]
+
+
+def test_sparse_fields_limit_the_response(coordinator):
+    response = TestClient(server.app).get("/api/dashboard/progress?fields=student_name")
+    assert response.status_code == 200
+    assert all(set(item) == {"student_name"} for item in response.json())
+
+
+def test_compact_progress_sends_each_classroom_once(coordinator):
+    body = TestClient(server.app).get("/api/dashboard/progress?compact=true").json()
+    assert body["classrooms"] == {"class1": {"name": "Desarrollo Web"}}
+    assert len(body["progress"]) == 2
+    assert all("classroom_name" not in item and item["classroom_id"] == "class1" for item in body["progress"])
+
+
+def test_compact_progress_with_sparse_fields(coordinator):
+    body = TestClient(server.app).get("/api/dashboard/progress?compact=true&fields=student_name").json()
+    assert body["classrooms"] == {"class1": {"name": "Desarrollo Web"}}
+    # classroom_id is kept so each summary can still be joined to its classroom
+    assert all(set(item) == {"student_name", "classroom_id"} for item in body["progress"])
+
+
+def test_user_fields_are_projected_in_mongo(coordinator, fake_db, monkeypatch):
+    monkeypatch.setattr(server, "tenant_cache", server.TenantCache())
+    fake_db.users.docs.append({"id": "u1", "email": "ana@example.com", "name": "Ana", "role": "student",
+                               "cohort_id": server.DEFAULT_COHORT_ID})
+    response = TestClient(server.app).get("/api/users?fields=id,email")
+    assert response.json() == [{"id": "u1", "email": "ana@example.com"}]
+    assert fake_db.users.queries == [
+        ("find", {"cohort_id": server.DEFAULT_COHORT_ID}, {"_id": 0, "id": 1, "email": 1}),
+    ]
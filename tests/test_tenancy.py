@@ -0,0 +1,105 @@
+import copy
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+import server
+
+USERS = [{"id": "u1", "email": "ana@example.com", "name": "Ana", "cohort_id": "c1",
+          "created_at": "2025-01-27T10:30:00+00:00"}]
+
+
+def make_request(headers=None):
+    raw = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def user(email="coordinator@example.com", role="coordinator"):
+    return server.User(email=email, name="User", role=role, cohort_id="c1")
+
+
+@pytest.fixture(autouse=True)
+def org_admin(monkeypatch):
+    monkeypatch.setattr(server, "ORG_ADMIN_EMAILS", {"admin@example.com"})
+    monkeypatch.setattr(server, "tenant_cache", server.TenantCache())
+
+
+@pytest.fixture
+def users_db(fake_db):
+    fake_db.users.docs.extend(copy.deepcopy(USERS))
+    return fake_db
+
+
+def test_coordinator_cannot_switch_cohort():
+    with pytest.raises(HTTPException) as error:
+        server.get_tenant(make_request({"X-Cohort-ID": "c2"}), user())
+    assert error.value.status_code == 403
+
+
+def test_org_admin_can_switch_cohort():
+    tenant = server.get_tenant(make_request({"X-Cohort-ID": "c2"}), user(email="admin@example.com"))
+    assert tenant.cohort_id == "c2"
+
+
+def test_cached_users_are_not_mutated_by_readers(users_db, monkeypatch):
+    async def coordinator(request, credentials=None):
+        return user()
+
+    monkeypatch.setattr(server, "get_current_user", coordinator)
+    client = TestClient(server.app)
+    first = client.get("/api/users?fields=id,created_at").json()
+    cached = server.tenant_cache.get("c1", ("users", ("id", "created_at")))
+    snapshot = copy.deepcopy(cached)
+    second = client.get("/api/users?fields=id,created_at").json()
+    assert first == second
+    assert cached == snapshot
+    assert isinstance(cached[0]["created_at"], datetime)
+    assert [query[1] for query in users_db.users.queries] == [{"cohort_id": "c1"}]
+
+
+def test_only_org_admins_assign_cohorts(users_db, monkeypatch):
+    current = {"user": user()}
+
+    async def current_user(request, credentials=None):
+        return current["user"]
+
+    monkeypatch.setattr(server, "get_current_user", current_user)
+    client = TestClient(server.app)
+    assert client.put("/api/users/u1/cohort?cohort_id=c2").status_code == 403
+    current["user"] = user(email="admin@example.com")
+    assert client.put("/api/users/u1/cohort?cohort_id=c2").status_code == 200
+    assert client.put("/api/users/missing/cohort?cohort_id=c2").status_code == 404
+
+
+def test_cohort_move_takes_enrollments_and_submissions(users_db, monkeypatch):
+    users_db.student_enrollments.docs.append({"id": "e1", "student_id": "u1", "classroom_id": "class-1",
+                                              "cohort_id": "c1"})
+    users_db.submissions.docs.extend([
+        {"id": "s1", "student_id": "u1", "google_submission_id": "g1", "cohort_id": "c1"},
+        {"id": "s2", "student_id": "u2", "google_submission_id": "g2", "cohort_id": "c1"},
+    ])
+
+    async def current_user(request, credentials=None):
+        return user(email="admin@example.com")
+
+    monkeypatch.setattr(server, "get_current_user", current_user)
+    assert TestClient(server.app).put("/api/users/u1/cohort?cohort_id=c2").status_code == 200
+    assert users_db.users.docs[0]["cohort_id"] == "c2"
+    assert users_db.student_enrollments.docs[0]["cohort_id"] == "c2"
+    assert [doc["cohort_id"] for doc in users_db.submissions.docs] == ["c2", "c1"]
+
+
+
+def test_startup_backfills_cohorts_before_serving(fake_db, monkeypatch):
+    fake_db.users.docs.append({"id": "legacy", "email": "old@example.com"})
+    monkeypatch.setattr(server, "classroom_event_batcher", server.ClassroomEventBatcher())
+
+    async def failing_requeue(filter=None):
+        raise RuntimeError("mongo down")
+
+    monkeypatch.setattr(server.classroom_event_batcher, "requeue_pending", failing_requeue)
+    with TestClient(server.app):
+        assert fake_db.users.docs[0]["cohort_id"] == server.DEFAULT_COHORT_ID